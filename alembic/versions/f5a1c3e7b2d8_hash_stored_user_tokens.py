@@ -0,0 +1,50 @@
+"""Hash stored user tokens
+
+Revision ID: f5a1c3e7b2d8
+Revises: e2f6a8c4b9d1
+Create Date: 2026-10-15 16:48:31.927450
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a1c3e7b2d8'
+down_revision: Union[str, Sequence[str], None] = 'e2f6a8c4b9d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+users = sa.table(
+    'users',
+    sa.column('id', sa.Integer),
+    sa.column('verification_token', sa.String),
+    sa.column('reset_token', sa.String),
+)
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest() if token is not None else None
+
+
+def upgrade() -> None:
+    # Replace outstanding plaintext tokens with their digests so links already sent keep working
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(users.c.id, users.c.verification_token, users.c.reset_token)
+        .where(sa.or_(users.c.verification_token.isnot(None), users.c.reset_token.isnot(None)))
+    ).all()
+    for row in rows:
+        conn.execute(
+            users.update()
+            .where(users.c.id == row.id)
+            .values(verification_token=_digest(row.verification_token), reset_token=_digest(row.reset_token))
+        )
+
+
+def downgrade() -> None:
+    # Digests can't be turned back into tokens; outstanding links stop working
+    pass
@@ -1,80 +1,181 @@
 import os
-import requests
-import json
+import asyncio
+import hashlib
+import logging
+import random
+import httpx
+import orjson
 from typing import List, Dict
+from cachetools import TTLCache
+
+logger = logging.getLogger("mizan.ai")
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 # Use environment variable or fallback to a placeholder
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your_openrouter_key_here")
 
+# Shared async client so repeat analyses reuse the pooled TLS connection to OpenRouter
+# without blocking the event loop while the model is generating
+_client = httpx.AsyncClient(
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    headers={
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "https://mizan.app", # Optional, for OpenRouter analytics
+        "X-Title": "Mizan Financial Advisor",
+        "Content-Type": "application/json"
+    },
+)
+
+# Retry policy for transient provider failures (rate limits, gateway errors, dropped sockets)
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0 # seconds
+RETRY_MAX_DELAY = 30.0 # seconds
+RETRY_JITTER = 0.5
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+async def _post_with_retry(payload: Dict) -> httpx.Response:
+    """
+    POSTs to OpenRouter, retrying transient failures with exponential backoff and jitter.
+    Client errors such as 400/401 are raised immediately since retrying cannot fix them.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        try:
+            response = await _client.post(OPENROUTER_API_URL, json=payload)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        else:
+            if last_attempt or response.status_code not in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+                return response
+
+        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+        await asyncio.sleep(delay * (1 - RETRY_JITTER * random.random()))
+
+# Prompts are fixed per language, so they are assembled once at import.
+# Each entry is the text before and after the transactions summary.
+_ROLE_DESCRIPTIONS = {
+    'ar': "بصفتك مستشارًا ماليًا خبيرًا.",
+    'en': "You are a financial advisor.",
+}
+_LANGUAGE_INSTRUCTIONS = {
+    'ar': "قم بالرد حصرياً بتنسيق JSON وباللغة العربية.",
+    'en': "Respond exclusively in JSON format and in English.",
+}
+_JSON_STRUCTURE = """
+JSON Structure:
+{
+  "summary": "overview text",
+  "insights": ["insight 1", "insight 2"],
+  "warnings": ["warning 1", "warning 2"],
+  "actions": ["action 1", "action 2"]
+}
+"""
+_PROMPTS = {
+    lang: (
+        f"{_ROLE_DESCRIPTIONS[lang]}\n{_LANGUAGE_INSTRUCTIONS[lang]}\n\nAnalyze the following financial data:\n",
+        "\n" + _JSON_STRUCTURE,
+    )
+    for lang in _ROLE_DESCRIPTIONS
+}
+_SYSTEM_MESSAGES = {
+    lang: {"role": "system", "content": f"{role} You always respond in valid JSON."}
+    for lang, role in _ROLE_DESCRIPTIONS.items()
+}
+_PAYLOAD_TEMPLATE = {
+    "model": "google/gemini-2.0-flash-001", # High quality and fast
+    "response_format": { "type": "json_object" }
+}
+
+# Successful analyses keyed by a digest of (lang, summary). The summary is rebuilt from the
+# submitted transactions, so any change to them yields a new key and no explicit invalidation is needed.
+_analysis_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+def _cache_key(transactions_summary: str, lang: str) -> bytes:
+    return hashlib.sha256(f"{lang}\0{transactions_summary}".encode()).digest()
+
+# Analyses currently being fetched, so concurrent identical requests share one upstream call
+_inflight: Dict[bytes, "asyncio.Future[Dict]"] = {}
+
+async def _fetch_analysis(transactions_summary: str, lang: str, cache_key: bytes) -> Dict:
+    prompt_head, prompt_tail = _PROMPTS[lang]
+    payload = dict(_PAYLOAD_TEMPLATE, messages=[
+        _SYSTEM_MESSAGES[lang],
+        {"role": "user", "content": prompt_head + transactions_summary + prompt_tail}
+    ])
+
+    try:
+        response = await _post_with_retry(payload)
+        envelope = orjson.loads(response.content)
+        analysis = orjson.loads(envelope['choices'][0]['message']['content'])
+        _analysis_cache[cache_key] = analysis
+        return analysis
+    except Exception as e:
+        logger.warning("AI Service Error: %s", e)
+        # Fallback response
+        if lang == 'ar':
+            return {
+                "summary": "عذراً، خدمة التحليل الذكي واجهت مشكلة فنية.",
+                "insights": ["يرجى المحاولة لاحقاً."],
+                "warnings": ["فشل الاتصال بالذكاء الاصطناعي."],
+                "actions": ["تأكد من مراجعة مصاريفك يدوياً حالياً."]
+            }
+        else:
+            return {
+                "summary": "Sorry, the smart analysis service encountered a technical issue.",
+                "insights": ["Please try again later."],
+                "warnings": ["AI connection failed."],
+                "actions": ["Make sure to review your expenses manually for now."]
+            }
+
+# Returned without calling the model when there is nothing to analyse
+_EMPTY_ANALYSES = {
+    'ar': {
+        "summary": "لا توجد معاملات لتحليلها بعد.",
+        "insights": ["أضف بعض الدخل والمصروفات للحصول على تحليل."],
+        "warnings": [],
+        "actions": ["ابدأ بتسجيل معاملاتك اليومية."]
+    },
+    'en': {
+        "summary": "There are no transactions to analyze yet.",
+        "insights": ["Add some income and expenses to get an analysis."],
+        "warnings": [],
+        "actions": ["Start by recording your daily transactions."]
+    },
+}
+
 class AIService:
     @staticmethod
-    def analyze_finances(transactions_summary: str, lang: str = 'ar') -> Dict:
+    async def analyze_finances(transactions_summary: str, lang: str = 'ar') -> Dict:
         """
         Sends structured prompts to OpenRouter to analyze financial data.
+        Identical requests within the cache TTL are served without calling the model,
+        and identical requests arriving while one is in flight wait for its result.
         """
-        role_description = "You are a financial advisor."
-        if lang == 'ar':
-            role_description = "بصفتك مستشارًا ماليًا خبيرًا."
-            language_instruction = "قم بالرد حصرياً بتنسيق JSON وباللغة العربية."
-        else:
-            language_instruction = "Respond exclusively in JSON format and in English."
-
-        prompt = f"""
-        {role_description}
-        {language_instruction}
-        
-        Analyze the following financial data:
-        {transactions_summary}
-        
-        JSON Structure:
-        {{
-          "summary": "overview text",
-          "insights": ["insight 1", "insight 2"],
-          "warnings": ["warning 1", "warning 2"],
-          "actions": ["action 1", "action 2"]
-        }}
-        """
+        if lang != 'ar':
+            lang = 'en'
+        if not transactions_summary:
+            return _EMPTY_ANALYSES[lang]
+        cache_key = _cache_key(transactions_summary, lang)
+        cached = _analysis_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "HTTP-Referer": "https://mizan.app", # Optional, for OpenRouter analytics
-            "X-Title": "Mizan Financial Advisor",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": "google/gemini-2.0-flash-001", # High quality and fast
-            "messages": [
-                {"role": "system", "content": f"{role_description} You always respond in valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            "response_format": { "type": "json_object" }
-        }
+        pending = _inflight.get(cache_key)
+        if pending is None:
+            pending = asyncio.ensure_future(_fetch_analysis(transactions_summary, lang, cache_key))
+            _inflight[cache_key] = pending
+            pending.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+        # Shielded so one client disconnecting doesn't cancel the call for the others
+        return await asyncio.shield(pending)
 
-        try:
-            response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            return json.loads(content)
-        except Exception as e:
-            print(f"AI Service Error: {e}")
-            # Fallback response
-            if lang == 'ar':
-                return {
-                    "summary": "عذراً، خدمة التحليل الذكي واجهت مشكلة فنية.",
-                    "insights": ["يرجى المحاولة لاحقاً."],
-                    "warnings": ["فشل الاتصال بالذكاء الاصطناعي."],
-                    "actions": ["تأكد من مراجعة مصاريفك يدوياً حالياً."]
-                }
-            else:
-                return {
-                    "summary": "Sorry, the smart analysis service encountered a technical issue.",
-                    "insights": ["Please try again later."],
-                    "warnings": ["AI connection failed."],
-                    "actions": ["Make sure to review your expenses manually for now."]
-                }
+    @staticmethod
+    async def aclose() -> None:
+        """
+        Releases pooled connections. Called on application shutdown.
+        """
+        await _client.aclose()
 
 ai_service = AIService()
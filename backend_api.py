@@ -1,26 +1,35 @@
 
 import os
+import asyncio
+import base64
+import hashlib
+import logging
+import queue
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
 
-import requests
+import orjson
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, status, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
-from jose import JWTError, jwt
-import re
+import jwt
 import secrets
-from passlib.context import CryptContext
-from pydantic import BaseModel, EmailStr, validator
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from pydantic import BaseModel, ConfigDict
 from fastapi.responses import JSONResponse
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session, sessionmaker, relationship
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String, case, event, insert, select, tuple_, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, relationship
+from cachetools import TTLCache
 
 try:
     from backend.ai import ai_service
@@ -28,27 +37,169 @@ except ImportError:
     # Handle if folder structure differs
     from ai import ai_service
 
+# Logging: records are queued and written to stderr by a listener thread,
+# so request handlers never block on the stream
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+log_listener = QueueListener(log_queue, log_stream_handler)
+logger = logging.getLogger("mizan")
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(log_queue))
+logger.propagate = False
+
 # Database Setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./mizan.db")
 # Fix for Railway internal Postgres URLs which might start with postgres:// instead of postgresql://
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The API runs on async drivers; Alembic keeps using DATABASE_URL with the sync ones
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+async_url = make_url(DATABASE_URL)
+async_url = async_url.set(drivername=f"{async_url.get_backend_name()}+{ASYNC_DRIVERS[async_url.get_backend_name()]}")
+# asyncpg has no libpq-style sslmode keyword; the same modes are accepted through its ssl argument
+async_connect_args = {}
+if "sslmode" in async_url.query:
+    async_connect_args["ssl"] = async_url.query["sslmode"]
+    async_url = async_url.difference_update_query(["sslmode"])
+
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_async_engine(async_url)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a write commits; NORMAL sync is durable under WAL
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-65536") # 64 MiB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456") # 256 MiB; reads come from the page cache without a copy
+        cursor.close()
+else:
+    engine = create_async_engine(async_url, connect_args=async_connect_args, pool_size=20, max_overflow=10, pool_pre_ping=True, pool_recycle=3600)
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Security Setup
 SECRET_KEY = os.getenv("JWT_SECRET", "mizan_secret_key_change_in_production")
 ALGORITHM = "HS256"
+# Encoded once so PyJWT doesn't convert the key on every encode/decode
+SECRET_KEY_BYTES = SECRET_KEY.encode()
+ALLOWED_ALGORITHMS = [ALGORITHM]
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 1 week
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2id at the OWASP baseline (19 MiB, 2 passes, 1 lane). argon2-cffi's defaults
+# (64 MiB, 3 passes, 4 lanes) cost ~6x more CPU and memory per login.
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1, hash_len=32)
+# Verified against for unknown emails so they cost as much as a wrong password
+DUMMY_PASSWORD_HASH = password_hasher.hash(secrets.token_urlsafe(16))
+# argon2-cffi releases the GIL, so hashes run in parallel here without stalling the
+# event loop. Each running hash holds 19 MiB, so the pool size bounds Argon2 memory per
+# process. It is set explicitly because os.cpu_count() reports the host's cores, not the
+# container's CPU quota.
+ARGON2_WORKERS = int(os.getenv("ARGON2_WORKERS", 2))
+hash_executor = ThreadPoolExecutor(max_workers=ARGON2_WORKERS, thread_name_prefix="argon2")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # Rate Limiting
-limiter = Limiter(key_func=get_remote_address)
+# path -> (max requests, window in seconds), per client IP
+RATE_LIMITS = {
+    "/login": (5, 60),
+    "/register": (5, 3600),
+}
+
+class SlidingWindowLimiter:
+    """
+    Allows `limit` hits per `window` seconds for each key. Buckets are kept in
+    least-recently-used order, so idle ones are dropped from the front as new
+    hits arrive and at most `max_keys` are ever held.
+    """
+    def __init__(self, limit: int, window: int, max_keys: int = 10_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.hits: "OrderedDict[object, Deque[float]]" = OrderedDict()
+
+    def hit(self, key) -> int:
+        """
+        Records a hit for `key`. Returns 0 if it is allowed, otherwise the
+        number of seconds until the oldest hit leaves the window.
+        """
+        now = time.monotonic()
+        hits = self.hits.get(key)
+        if hits is None:
+            hits = self.hits[key] = deque()
+        else:
+            self.hits.move_to_end(key)
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return int(hits[0] + self.window - now) + 1
+        hits.append(now)
+
+        while len(self.hits) > self.max_keys:
+            self.hits.popitem(last=False)
+        # Amortised O(1): each idle bucket is examined once before being dropped
+        while True:
+            oldest = next(iter(self.hits.values()))
+            if oldest and oldest[-1] > now - self.window:
+                break
+            self.hits.popitem(last=False)
+        return 0
+
+class RateLimitMiddleware:
+    """
+    Sliding-window limiter for the POST endpoints in RATE_LIMITS, written as
+    plain ASGI so throttled requests are rejected before routing, body
+    parsing or any database work, and other requests pass straight through.
+    """
+    def __init__(self, app, rules: Dict[str, Tuple[int, int]]):
+        self.app = app
+        self.limiters = {path: SlidingWindowLimiter(limit, window) for path, (limit, window) in rules.items()}
+
+    async def __call__(self, scope, receive, send):
+        limiter = self.limiters.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        client = scope.get("client")
+        retry_after = limiter.hit(client[0] if client else None)
+        if retry_after:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(RATE_LIMITED_BODY)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": RATE_LIMITED_BODY})
+            return
+        await self.app(scope, receive, send)
+
+RATE_LIMITED_BODY = b'{"success":false,"message":"Too many requests. Please try again later."}'
+
+class HealthCheckMiddleware:
+    """
+    Answers load balancer probes on /health directly from ASGI, skipping the
+    rest of the middleware stack, routing and response serialization.
+    """
+    def __init__(self, app, path: str = "/health"):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        await send({"type": "http.response.start", "status": 200, "headers": HEALTH_HEADERS})
+        await send({"type": "http.response.body", "body": HEALTH_BODY if scope["method"] == "GET" else b""})
+
+HEALTH_BODY = b'{"status":"healthy"}'
+HEALTH_HEADERS = [(b"content-type", b"application/json"), (b"content-length", str(len(HEALTH_BODY)).encode())]
 
 # Models
 class UserDB(Base):
@@ -58,10 +209,12 @@ class UserDB(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_verified = Column(Integer, default=0) # 0: false, 1: true
-    verification_token = Column(String, nullable=True)
-    reset_token = Column(String, nullable=True)
+    verification_token = Column(String, nullable=True, index=True) # SHA-256 hex digest, see token_digest()
+    reset_token = Column(String, nullable=True, index=True) # SHA-256 hex digest
     failed_login_attempts = Column(Integer, default=0)
     lockout_until = Column(DateTime, nullable=True)
+    data_version = Column(Integer, default=0, server_default="0", nullable=False) # Bumped on every transaction/category write
+    token_version = Column(Integer, default=0, server_default="0", nullable=False) # Bumped to revoke issued access tokens
     transactions = relationship("TransactionDB", back_populates="owner")
     categories = relationship("CategoryDB", back_populates="owner")
 
@@ -70,7 +223,7 @@ class CategoryDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
     type = Column(String) # 'income' | 'expense'
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("UserDB", back_populates="categories")
 
 class TransactionDB(Base):
@@ -81,9 +234,21 @@ class TransactionDB(Base):
     category = Column(String)
     type = Column(String) # 'income' | 'expense'
     created_at = Column(DateTime, default=datetime.utcnow)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("UserDB", back_populates="transactions")
 
+    # Serves the per-user listing ordered by newest first
+    __table_args__ = (Index("ix_tx_user_created", "user_id", "created_at"),)
+
+# Columns backing the Transaction / Category schemas. List endpoints select
+# exactly these and serialize the rows directly, skipping ORM hydration and
+# response_model re-validation of data we just read from our own tables.
+TRANSACTION_COLUMNS = (
+    TransactionDB.title, TransactionDB.amount, TransactionDB.category, TransactionDB.type,
+    TransactionDB.id, TransactionDB.user_id, TransactionDB.created_at,
+)
+CATEGORY_COLUMNS = (CategoryDB.name, CategoryDB.type, CategoryDB.id, CategoryDB.user_id)
+
 # Pydantic Schemas
 class TransactionBase(BaseModel):
     title: str
@@ -99,9 +264,7 @@ class Transaction(TransactionBase):
     user_id: int
     created_at: datetime
 
-    class Config:
-        orm_mode = True # For Pydantic v1
-        from_attributes = True # For Pydantic v2
+    model_config = ConfigDict(from_attributes=True)
 
 class UserBase(BaseModel):
     email: str
@@ -114,9 +277,7 @@ class User(UserBase):
     id: int
     is_verified: int # 0 or 1
 
-    class Config:
-        orm_mode = True
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class CategoryBase(BaseModel):
     name: str
@@ -129,9 +290,7 @@ class Category(CategoryBase):
     id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PasswordChange(BaseModel):
     old_password: str
@@ -149,25 +308,53 @@ class Token(BaseModel):
     token_type: str
     user: User
 
+class CurrentUser(NamedTuple):
+    """
+    Lightweight identity of the authenticated caller. Endpoints that need
+    the full row (e.g. to change the password) load it explicitly.
+    """
+    id: int
+    email: str
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, which encodes datetimes natively.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
 # Utils
 import secrets
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_password_hash(password):
-    # Safety check: Argon2 (via passlib) handles long passwords fine, 
+async def get_password_hash(password):
+    # Safety check: Argon2 handles long passwords fine, 
     # but we validate length explicitly to prevent any potential issues.
     if len(password) > 128:
         raise ValueError("Password is too long.")
-    return pwd_context.hash(password)
+    return await asyncio.get_running_loop().run_in_executor(hash_executor, password_hasher.hash, password)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def _verify_password_sync(plain_password, hashed_password):
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+async def verify_password(plain_password, hashed_password):
+    return await asyncio.get_running_loop().run_in_executor(hash_executor, _verify_password_sync, plain_password, hashed_password)
+
+# Byte -> character-class flag, so the policy check is one translate() pass in C
+PW_UPPER, PW_LOWER, PW_DIGIT, PW_SPECIAL = 1, 2, 4, 8
+PW_CHAR_CLASSES = bytes(
+    PW_UPPER if 65 <= b <= 90 else
+    PW_LOWER if 97 <= b <= 122 else
+    PW_DIGIT if 48 <= b <= 57 else
+    PW_SPECIAL if b in b"@$!%*?&" else 0
+    for b in range(256)
+)
 
 def validate_password_strength(password: str):
     """
@@ -177,61 +364,212 @@ def validate_password_strength(password: str):
         return "Password must be at least 8 characters long."
     if len(password) > 128:
         return "Password is too long."
-    if not re.search(r"[A-Z]", password):
+    classes = set(password.encode().translate(PW_CHAR_CLASSES))
+    if PW_UPPER not in classes:
         return "Password must contain at least one uppercase letter."
-    if not re.search(r"[a-z]", password):
+    if PW_LOWER not in classes:
         return "Password must contain at least one lowercase letter."
-    if not re.search(r"\d", password):
+    # Non-ASCII digits (e.g. Arabic-Indic) count too, as they did with \d
+    if PW_DIGIT not in classes and not any(ch.isdecimal() for ch in password):
         return "Password must contain at least one number."
-    if not re.search(r"[@$!%*?&]", password):
+    if PW_SPECIAL not in classes:
         return "Password must contain at least one special character (@$!%*?&)."
     return None
 
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    return jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
 
 def generate_token():
     return secrets.token_urlsafe(32)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def token_digest(token: str) -> str:
+    """
+    Verification and reset tokens are stored only as this digest, so a database
+    leak doesn't expose usable links.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def bump_data_version(db: AsyncSession, user_id: int):
+    """
+    Invalidates the ETags of the user's list endpoints. Call before committing a write.
+    """
+    await db.execute(update(UserDB).where(UserDB.id == user_id).values(data_version=UserDB.data_version + 1))
+
+async def data_etag(db: AsyncSession, user_id: int, representation: str = "") -> str:
+    """
+    `representation` distinguishes alternative encodings of the same data, so a
+    cache can't revalidate one body type with the other's tag.
+    """
+    version = await db.scalar(select(UserDB.data_version).where(UserDB.id == user_id))
+    suffix = f"-{representation}" if representation else ""
+    return f'W/"{user_id}-{version}{suffix}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    return if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(","))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def accept_quality(accept: str, media_type: str) -> float:
+    """
+    q-value the Accept header gives `media_type`, from its most specific matching range.
+    """
+    main_type = media_type.split("/", 1)[0]
+    best, best_specificity = 0.0, -1
+    for media_range in accept.split(","):
+        name, *params = (part.strip() for part in media_range.split(";"))
+        name = name.lower()
+        if name == media_type:
+            specificity = 2
+        elif name == f"{main_type}/*":
+            specificity = 1
+        elif name == "*/*":
+            specificity = 0
+        else:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if specificity > best_specificity:
+            best, best_specificity = quality, specificity
+    return best
+
+def prefers_ndjson(request: Request) -> bool:
+    # Only an explicit NDJSON range counts; wildcards like */* keep the JSON array
+    accept = request.headers.get("accept", "")
+    if NDJSON_MEDIA_TYPE not in accept.lower():
+        return False
+    ndjson_quality = accept_quality(accept, NDJSON_MEDIA_TYPE)
+    return ndjson_quality > 0 and ndjson_quality >= accept_quality(accept, "application/json")
+
+def encode_cursor(created_at: datetime, tx_id: int) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([created_at, tx_id])).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, tx_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), int(tx_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Bearer token digest -> (CurrentUser, exp, ver), so hot tokens skip both the JWT
+# signature check and the users SELECT. Keyed by a digest so the cache never
+# holds usable credentials.
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+# user id -> lowest token version still accepted, checked on every cache hit so a
+# lookup that raced a revocation can't keep an old token alive in the cache
+_min_token_version: Dict[int, int] = {}
+
+def token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+def revoke_tokens(user_id: int, token_version: int):
+    """
+    Rejects cached tokens older than `token_version`. Call after committing the
+    bumped users.token_version.
+    """
+    _min_token_version[user_id] = max(token_version, _min_token_version.get(user_id, 0))
+    for key, (cached_user, _, _) in list(_token_cache.items()):
+        if cached_user.id == user_id:
+            _token_cache.pop(key, None)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    cache_key = token_cache_key(token)
+    cached = _token_cache.get(cache_key)
+    if cached is not None and cached[1] > time.time() and cached[2] >= _min_token_version.get(cached[0].id, 0):
+        return cached[0]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY_BYTES, algorithms=ALLOWED_ALGORITHMS)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise credentials_exception
-    user = db.query(UserDB).filter(UserDB.email == email).first()
-    if user is None:
+
+    row = (await db.execute(
+        select(UserDB.id, UserDB.token_version).where(UserDB.email == email).limit(1)
+    )).first()
+    token_version = payload.get("ver", 0)
+    if row is None or token_version != row.token_version or token_version < _min_token_version.get(row.id, 0):
         raise credentials_exception
-    return user
+
+    current_user = CurrentUser(id=row.id, email=email)
+    _token_cache[cache_key] = (current_user, payload["exp"], token_version)
+    return current_user
+
+# /analyze spends model credits, so it is limited per account once the token has been verified
+analyze_limiter = SlidingWindowLimiter(limit=20, window=60)
+
+async def analyze_rate_limit(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    retry_after = analyze_limiter.hit(current_user.id)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+    return current_user
 
 # API
 app = FastAPI(title="Mizan API")
-app.state.limiter = limiter
+
+@app.on_event("startup")
+def start_log_listener():
+    log_listener.start()
+
+@app.on_event("startup")
+async def create_dev_schema():
+    # Schema is owned by Alembic; this shortcut is only for throwaway local databases
+    if os.getenv("AUTO_CREATE_DB") == "1":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+@app.on_event("shutdown")
+async def close_ai_client():
+    await ai_service.aclose()
+
+@app.on_event("shutdown")
+async def dispose_engine():
+    await engine.dispose()
+
+@app.on_event("shutdown")
+def stop_hash_executor():
+    hash_executor.shutdown(wait=False)
+
+@app.on_event("shutdown")
+def stop_log_listener():
+    # Flushes whatever is still queued
+    log_listener.stop()
+
 # Global Exception Handler for Standardized JSON Errors
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
             "message": str(exc.detail)
-        }
+        },
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
-    print(f"Unhandled Exception: {exc}")
-    return JSONResponse(
+    logger.error("Unhandled exception on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -239,102 +577,111 @@ async def generic_exception_handler(request: Request, exc: Exception):
         }
     )
 
+app.add_middleware(RateLimitMiddleware, rules=RATE_LIMITS)
+
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
+# Added after the rate limiter so CORS headers are also applied to rate-limited responses
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-@app.get("/health")
-def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+# Outermost, so health probes never reach CORS or the rate limiter
+app.add_middleware(HealthCheckMiddleware)
 
 @app.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    print(f"Registration attempt for: {user.email}")
-    db_user = db.query(UserDB).filter(UserDB.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    logger.info("Registration attempt for: %s", user.email)
+
     # Password Policy Validation
     error_message = validate_password_strength(user.password)
     if error_message:
         raise HTTPException(status_code=400, detail=error_message)
     
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash(user.password)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
     verification_token = generate_token()
-    new_user = UserDB(
-        email=user.email, 
-        name=user.name, 
-        hashed_password=hashed_password,
-        verification_token=verification_token,
-        is_verified=0
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # The unique index on email rejects duplicates, so no existence check is needed up front
+    try:
+        user_id = await db.scalar(
+            insert(UserDB).values(
+                email=user.email,
+                name=user.name,
+                hashed_password=hashed_password,
+                verification_token=token_digest(verification_token),
+                is_verified=0
+            ).returning(UserDB.id)
+        )
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Log the verification link (simulating email send)
     # In a real fintech app, use AWS SES / SendGrid
-    print(f"VERIFICATION LINK for {new_user.email}: http://localhost:3000/verify/{verification_token}")
+    logger.info("VERIFICATION LINK for %s: http://localhost:3000/verify/%s", user.email, verification_token)
     
     return {
         "success": True,
         "message": "Account created. Please verify your email before logging in.",
-        "user_id": new_user.id
+        "user_id": user_id
     }
 
 @app.get("/verify-email/{token}")
-def verify_email(token: str, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.verification_token == token).first()
-    if not user:
+async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
+    user_id = await db.scalar(
+        update(UserDB)
+        .where(UserDB.verification_token == token_digest(token))
+        .values(is_verified=1, verification_token=None)
+        .returning(UserDB.id)
+    )
+    if user_id is None:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
-    
-    user.is_verified = 1
-    user.verification_token = None
-    db.commit()
+    await db.commit()
     return {"detail": "Email verified successfully"}
 
 @app.post("/login", response_model=Token)
-@limiter.limit("5/minute")
-def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.email == form_data.username).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserDB).where(UserDB.email == form_data.username))
 
     # Check for account lockout
-    if user.lockout_until and user.lockout_until > datetime.utcnow():
+    if user and user.lockout_until and user.lockout_until > datetime.utcnow():
         wait_minutes = int((user.lockout_until - datetime.utcnow()).total_seconds() / 60) + 1
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail=f"Account locked due to multiple failed attempts. Please try again in {wait_minutes} minutes."
         )
 
-    if not verify_password(form_data.password, user.hashed_password):
-        # Handle failed attempt
-        user.failed_login_attempts += 1
-        if user.failed_login_attempts >= 5:
-            user.lockout_until = datetime.utcnow() + timedelta(minutes=15)
-            user.failed_login_attempts = 0 # Reset for next cycle
-            db.commit()
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Too many failed attempts. Account has been locked for 15 minutes."
+    # Unknown emails still pay for an Argon2 verify so timing doesn't reveal which accounts exist
+    hashed_password = user.hashed_password if user else DUMMY_PASSWORD_HASH
+    if not await verify_password(form_data.password, hashed_password) or not user:
+        if user:
+            # Handle failed attempt in one atomic UPDATE; the counter restarts when the lock is applied
+            reaches_limit = UserDB.failed_login_attempts + 1 >= 5
+            attempts = await db.scalar(
+                update(UserDB)
+                .where(UserDB.id == user.id)
+                .values(
+                    failed_login_attempts=case((reaches_limit, 0), else_=UserDB.failed_login_attempts + 1),
+                    lockout_until=case((reaches_limit, datetime.utcnow() + timedelta(minutes=15)), else_=UserDB.lockout_until),
+                )
+                .returning(UserDB.failed_login_attempts)
+                .execution_options(synchronize_session=False)
             )
-        db.commit()
+            await db.commit()
+            if attempts == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Too many failed attempts. Account has been locked for 15 minutes."
+                )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -347,108 +694,223 @@ def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db
             detail="Please verify your email address before logging in."
         )
     
-    # Successful login: Reset failed attempts and lockout
-    user.failed_login_attempts = 0
-    user.lockout_until = None
-    db.commit()
+    # Successful login: Reset failed attempts and lockout, writing only when there is something to change
+    changed = False
+    if user.failed_login_attempts or user.lockout_until:
+        user.failed_login_attempts = 0
+        user.lockout_until = None
+        changed = True
+    # Upgrade hashes created with older cost parameters while we have the plaintext
+    if password_hasher.check_needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash(form_data.password)
+        changed = True
+    if changed:
+        await db.commit()
         
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email, "ver": user.token_version})
     return {"access_token": access_token, "token_type": "bearer", "user": user}
 
+TRANSACTIONS_PAGE_SIZE = 200
+TRANSACTIONS_MAX_PAGE_SIZE = 500
+
 @app.get("/transactions", response_model=List[Transaction])
-def get_transactions(current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(TransactionDB).filter(TransactionDB.user_id == current_user.id).order_by(TransactionDB.created_at.desc()).all()
+async def get_transactions(
+    request: Request,
+    limit: int = Query(TRANSACTIONS_PAGE_SIZE, ge=1, le=TRANSACTIONS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns one page of the history, newest first. The `X-Next-Cursor` response
+    header (absent on the last page) is passed back as `cursor` to fetch the next
+    page. Send `Accept: application/x-ndjson` to receive one JSON object per line
+    instead of an array.
+    """
+    ndjson = prefers_ndjson(request)
+    etag = await data_etag(db, current_user.id, "ndjson" if ndjson else "")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    stmt = (
+        select(*TRANSACTION_COLUMNS)
+        .where(TransactionDB.user_id == current_user.id)
+        .order_by(TransactionDB.created_at.desc(), TransactionDB.id.desc())
+    )
+    if cursor is not None:
+        stmt = stmt.where(tuple_(TransactionDB.created_at, TransactionDB.id) < decode_cursor(cursor))
+    # One extra row tells us whether another page exists
+    rows = (await db.execute(stmt.limit(limit + 1))).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    if ndjson:
+        return Response(b"".join(orjson.dumps(dict(row)) + b"\n" for row in rows), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    return ORJSONResponse([dict(row) for row in rows], headers=headers)
 
 @app.post("/transactions", response_model=Transaction)
-def create_transaction(transaction: TransactionCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_item = TransactionDB(**transaction.dict(), user_id=current_user.id)
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+async def create_transaction(transaction: TransactionCreate, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    stmt = insert(TransactionDB).values(**transaction.model_dump(), user_id=current_user.id).returning(*TRANSACTION_COLUMNS)
+    row = (await db.execute(stmt)).mappings().one()
+    await bump_data_version(db, current_user.id)
+    await db.commit()
+    return dict(row)
 
 @app.delete("/transactions/{transaction_id}")
-def delete_transaction(transaction_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_item = db.query(TransactionDB).filter(TransactionDB.id == transaction_id, TransactionDB.user_id == current_user.id).first()
+async def delete_transaction(transaction_id: int, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(TransactionDB).where(TransactionDB.id == transaction_id, TransactionDB.user_id == current_user.id))
     if not db_item:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    db.delete(db_item)
-    db.commit()
+    await db.delete(db_item)
+    await bump_data_version(db, current_user.id)
+    await db.commit()
     return {"detail": "Deleted"}
 
 # Category Endpoints
 @app.get("/categories", response_model=List[Category])
-def get_categories(current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(CategoryDB).filter(CategoryDB.user_id == current_user.id).all()
+async def get_categories(request: Request, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    etag = await data_etag(db, current_user.id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    rows = (await db.execute(select(*CATEGORY_COLUMNS).where(CategoryDB.user_id == current_user.id))).mappings()
+    return ORJSONResponse([dict(row) for row in rows], headers=headers)
 
 @app.post("/categories", response_model=Category)
-def create_category(category: CategoryCreate, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_item = CategoryDB(**category.dict(), user_id=current_user.id)
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+async def create_category(category: CategoryCreate, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    stmt = insert(CategoryDB).values(**category.model_dump(), user_id=current_user.id).returning(*CATEGORY_COLUMNS)
+    row = (await db.execute(stmt)).mappings().one()
+    await bump_data_version(db, current_user.id)
+    await db.commit()
+    return dict(row)
 
 @app.delete("/categories/{category_id}")
-def delete_category(category_id: int, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_item = db.query(CategoryDB).filter(CategoryDB.id == category_id, CategoryDB.user_id == current_user.id).first()
+async def delete_category(category_id: int, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    db_item = await db.scalar(select(CategoryDB).where(CategoryDB.id == category_id, CategoryDB.user_id == current_user.id))
     if not db_item:
         raise HTTPException(status_code=404, detail="Category not found")
-    db.delete(db_item)
-    db.commit()
+    await db.delete(db_item)
+    await bump_data_version(db, current_user.id)
+    await db.commit()
     return {"detail": "Deleted"}
 
 # Security Endpoints
 @app.post("/change-password")
-def change_password(data: PasswordChange, current_user: UserDB = Depends(get_current_user), db: Session = Depends(get_db)):
-    if not verify_password(data.old_password, current_user.hashed_password):
+async def change_password(data: PasswordChange, current_user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    user = await db.get(UserDB, current_user.id)
+    if not await verify_password(data.old_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
-    current_user.hashed_password = get_password_hash(data.new_password)
-    db.commit()
-    return {"detail": "Password updated"}
+    user.hashed_password = await get_password_hash(data.new_password)
+    # Sign out every other session; the caller continues with the fresh token
+    user.token_version += 1
+    await db.commit()
+    revoke_tokens(user.id, user.token_version)
+    access_token = create_access_token(data={"sub": user.email, "ver": user.token_version})
+    return {"detail": "Password updated", "access_token": access_token, "token_type": "bearer"}
 
 @app.post("/forgot-password")
-def forgot_password(data: PasswordResetRequest, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.email == data.email).first()
-    if user:
-        token = generate_token()
-        user.reset_token = token
-        db.commit()
-        print(f"RESET LINK for {user.email}: http://localhost:3000/reset-password/{token}")
+async def forgot_password(data: PasswordResetRequest, db: AsyncSession = Depends(get_db)):
+    token = generate_token()
+    email = await db.scalar(
+        update(UserDB)
+        .where(UserDB.email == data.email)
+        .values(reset_token=token_digest(token))
+        .returning(UserDB.email)
+    )
+    if email:
+        await db.commit()
+        logger.info("RESET LINK for %s: http://localhost:3000/reset-password/%s", email, token)
     
     return {"detail": "If email exists, a reset link has been sent"}
 
 @app.post("/reset-password")
-def reset_password(data: PasswordReset, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.reset_token == data.token).first()
-    if not user:
+async def reset_password(data: PasswordReset, db: AsyncSession = Depends(get_db)):
+    reset_token = token_digest(data.token)
+    # Check the token before spending an Argon2 hash on the request
+    user_id = await db.scalar(select(UserDB.id).where(UserDB.reset_token == reset_token).limit(1))
+    if user_id is None:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
-    
-    user.hashed_password = get_password_hash(data.new_password)
-    user.reset_token = None
-    db.commit()
+
+    try:
+        hashed_password = await get_password_hash(data.new_password)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Matching on the token again makes a reset link single-use under concurrent submits
+    row = (await db.execute(
+        update(UserDB)
+        .where(UserDB.id == user_id, UserDB.reset_token == reset_token)
+        .values(hashed_password=hashed_password, reset_token=None, token_version=UserDB.token_version + 1)
+        .returning(UserDB.id, UserDB.token_version)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+    await db.commit()
+    revoke_tokens(row.id, row.token_version)
     return {"detail": "Password reset successful"}
 
 # AI Service Integration
-OLLAMA_URL = "http://192.168.1.2:11434/api/generate"
-MODEL_NAME = "glm4:9b"
+format_summary_line = "- {}: {} ({} SAR) category: {}".format
 
 @app.post("/analyze")
-async def analyze_finances(transactions: List[TransactionBase], lang: str = "ar", current_user: UserDB = Depends(get_current_user)):
-    summary = "\n".join([f"- {t.type}: {t.title} ({t.amount} SAR) category: {t.category}" for t in transactions])
+async def analyze_finances(transactions: List[TransactionBase], lang: str = "ar", current_user: CurrentUser = Depends(analyze_rate_limit)):
+    summary = "\n".join(format_summary_line(t.type, t.title, t.amount, t.category) for t in transactions)
     
-    analysis = ai_service.analyze_finances(summary, lang=lang)
-    return analysis
+    return await ai_service.analyze_finances(summary, lang=lang)
 
 # Serve Frontend Static Files
+STATIC_MEMORY_CACHE_MAX_SIZE = 256 * 1024
+
+class CachedStaticFiles(StaticFiles):
+    """
+    Vite fingerprints everything it emits under assets/, so those files can be
+    cached by the browser indefinitely. Everything else (index.html) is
+    revalidated on each load so new deploys are picked up.
+
+    Small files are read into memory once at startup and served from there for
+    plain GETs while their size and mtime still match what is on disk.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.memory_cache: Dict[str, Tuple[float, int, bytes]] = {}
+        for directory in self.all_directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    full_path = os.path.realpath(os.path.join(root, name))
+                    stat_result = os.stat(full_path)
+                    if stat_result.st_size <= STATIC_MEMORY_CACHE_MAX_SIZE:
+                        with open(full_path, "rb") as f:
+                            self.memory_cache[full_path] = (stat_result.st_mtime, stat_result.st_size, f.read())
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        cached = self.memory_cache.get(str(full_path))
+        if (
+            cached is not None
+            and response.status_code == status_code
+            and scope["method"] == "GET"
+            and b"range" not in dict(scope["headers"])
+            and cached[:2] == (stat_result.st_mtime, stat_result.st_size)
+        ):
+            response = Response(cached[2], status_code=status_code, headers=dict(response.headers))
+        if self.get_path(scope).startswith("assets" + os.sep):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
 # This should be at the end to avoid intercepting API routes
 try:
-    app.mount("/", StaticFiles(directory="dist", html=True), name="static")
+    app.mount("/", CachedStaticFiles(directory="dist", html=True), name="static")
 except Exception:
     # Directory might not exist yet during initial dev
     pass
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # uvicorn[standard] provides uvloop and httptools, which "auto" picks up where available
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run("backend_api:app", host="0.0.0.0", port=port, loop="auto", http="auto", workers=workers)
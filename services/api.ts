@@ -62,11 +62,18 @@ export const apiService = {
     },
 
     getTransactions: async (): Promise<Transaction[]> => {
-        const response = await fetch(`${API_URL}/transactions`, {
-            headers: getHeaders()
-        });
-        if (!response.ok) throw new Error('Failed to fetch transactions');
-        const data = await response.json();
+        // The list is paginated; follow X-Next-Cursor until the last page
+        const data: any[] = [];
+        let cursor: string | null = null;
+        do {
+            const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`${API_URL}/transactions${query}`, {
+                headers: getHeaders()
+            });
+            if (!response.ok) throw new Error('Failed to fetch transactions');
+            data.push(...await response.json());
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
         // Map backend response (id is number, created_at is string) to frontend types
         return data.map((t: any) => ({
             ...t,
@@ -153,6 +160,10 @@ export const apiService = {
             const error = await response.json();
             throw new Error(error.detail || 'Failed to change password');
         }
+
+        // Changing the password revokes existing tokens; keep the session alive with the new one
+        const data = await response.json();
+        if (data.access_token) localStorage.setItem('mizan_token', data.access_token);
     },
 
     forgotPassword: async (email: string): Promise<void> => {